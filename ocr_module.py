@@ -1,10 +1,15 @@
+import asyncio
 import base64
-import contextlib
+import functools
+import hashlib
 import io
 import logging
 import os
-import threading
+import random
 import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
 from typing import List, Sequence, Tuple
 
 import httpx
@@ -14,12 +19,53 @@ from olmocr.prompts import PageResponse, build_no_anchoring_v4_yaml_prompt
 from olmocr.train.dataloader import FrontMatterParser
 
 logger = logging.getLogger(__name__)
-ocr_lock = threading.Lock()
+
+TRANSIENT_STATUS_CODES = frozenset({408, 409, 425, 429, 500, 502, 503, 504})
+RATE_LIMIT_MARKERS = ("rate limit", "quota")
+
+
+@functools.cache
+def _get_prompt() -> str:
+    return build_no_anchoring_v4_yaml_prompt()
+
+
+@functools.cache
+def _get_parser() -> FrontMatterParser:
+    return FrontMatterParser(front_matter_class=PageResponse)
 
 
 class TemporaryOcrError(Exception):
     """Raised when the upstream olmOCR endpoint indicates a transient failure."""
 
+    def __init__(self, message: str, retry_after: float | None = None) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AsyncRateLimiter:
+    """Token bucket capping how many requests per second are sent to the server.
+
+    Tokens are reserved synchronously (the balance may go negative), so concurrent
+    callers queue up behind each other without needing a loop-bound lock.
+    """
+
+    def __init__(self, rate: float, burst: float | None = None) -> None:
+        self.rate = float(rate)
+        self.capacity = max(1.0, float(burst if burst is not None else self.rate))
+        self.tokens = self.capacity
+        self.last = time.monotonic()
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        self.tokens -= 1
+        if self.tokens < 0:
+            await asyncio.sleep(-self.tokens / self.rate)
+
 
 class OCRProcessor:
     """Thin client around the olmOCR OpenAI-compatible API."""
@@ -34,6 +80,10 @@ class OCRProcessor:
         request_timeout: float = 90.0,
         temperature_schedule: Sequence[float] | None = None,
         target_longest_image_dim: int = 1400,
+        max_concurrency: int | None = None,
+        requests_per_second: float | None = None,
+        max_page_seconds: float | None = None,
+        page_cache_size: int = 1024,
     ) -> None:
         self.server_url = (server_url or os.getenv("OLMOCR_SERVER_URL", "http://localhost:30024/v1")).rstrip("/")
         self.api_key = api_key or os.getenv("OLMOCR_API_KEY")
@@ -42,82 +92,235 @@ class OCRProcessor:
         self.max_retries = max_retries
         self.temperature_schedule = tuple(temperature_schedule or (0.1, 0.2, 0.3, 0.5, 0.8))
         self.target_longest_image_dim = max(256, int(target_longest_image_dim))
-        self._prompt = build_no_anchoring_v4_yaml_prompt()
-        self._parser = FrontMatterParser(front_matter_class=PageResponse)
-        timeout = httpx.Timeout(timeout=request_timeout)
-        self._client = httpx.Client(timeout=timeout)
+        self.max_concurrency = max(1, int(max_concurrency or os.getenv("OLMOCR_MAX_CONCURRENCY", 4)))
+        self._prompt = _get_prompt()
+        self._parser = _get_parser()
+        self.page_cache_size = max(0, int(page_cache_size))
+        self._page_cache: OrderedDict[bytes, str] = OrderedDict()
+        # Futures belong to one event loop, so in-flight entries are keyed by (loop, digest).
+        self._page_inflight: dict[Tuple[asyncio.AbstractEventLoop, bytes], asyncio.Future[str]] = {}
+        self.max_page_seconds = (
+            max_page_seconds if max_page_seconds is not None else float(os.getenv("OLMOCR_MAX_PAGE_SECONDS", 0))
+        )
+        rps = requests_per_second if requests_per_second is not None else float(os.getenv("OLMOCR_RPS", 8))
+        self._limiter = AsyncRateLimiter(rate=rps)
+        self._timeout = httpx.Timeout(timeout=request_timeout)
+        # AsyncClient pools are bound to the event loop that created them, so the
+        # client is opened lazily inside the running loop and kept until aclose() (see _get_client).
+        self._clients: dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
         logger.info(
-            "Initialized olmOCR client -> server=%s model=%s retries=%s",
+            "Initialized olmOCR client -> server=%s model=%s retries=%s concurrency=%s",
             self.server_url,
             self.model_name,
             self.max_retries,
+            self.max_concurrency,
         )
 
-    def __del__(self) -> None:  # pragma: no cover - best effort cleanup
-        client = getattr(self, "_client", None)
-        if client:
-            with contextlib.suppress(Exception):
-                client.close()
-
     def process_image(self, image_np: np.ndarray) -> List[Tuple[str, float]]:
         """Process an RGB/greyscale numpy array and return text fragments with dummy confidence."""
+        return self.process_images([image_np])[0]
+
+    def process_images(self, images: Sequence[np.ndarray]) -> List[List[Tuple[str, float]]]:
+        """Synchronous wrapper around :meth:`aprocess_images` for non-async callers.
+
+        Each call opens and closes its own connection pool; long-running callers should await
+        :meth:`aprocess_images` inside one event loop and call :meth:`aclose` once at the end.
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self._process_and_close(images))
+        # Called from inside a running loop: asyncio.run would refuse, so use a private loop on a worker thread.
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(asyncio.run, self._process_and_close(images)).result()
+
+    async def aprocess_images(self, images: Sequence[np.ndarray]) -> List[List[Tuple[str, float]]]:
+        """Process several pages concurrently, keeping at most ``max_concurrency`` requests in flight."""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def bounded(image_np: np.ndarray) -> List[Tuple[str, float]]:
+            async with semaphore:
+                return await self.aprocess_image(image_np)
+
+        return list(await asyncio.gather(*(bounded(image_np) for image_np in images)))
+
+    async def aprocess_image(self, image_np: np.ndarray) -> List[Tuple[str, float]]:
+        """Async counterpart of :meth:`process_image`."""
         if image_np is None or image_np.size == 0:
             return []
 
-        pil_image = self._prepare_pil_image(image_np)
-        natural_text = self._run_with_retries(pil_image)
+        pil_image, cache_key = await asyncio.to_thread(self._prepare_page, image_np)
+        natural_text = self._page_cache_get(cache_key)
+        pending = self._page_inflight.get((asyncio.get_running_loop(), cache_key))
+        if natural_text is not None:
+            logger.info("Reusing olmOCR result for a duplicate page")
+        elif pending is not None:
+            # An identical page is already being OCR'd; shield so our cancellation does not cancel it.
+            logger.info("Waiting on in-flight olmOCR request for a duplicate page")
+            natural_text = await asyncio.shield(pending)
+        else:
+            natural_text = await self._run_page(pil_image, cache_key)
         if not natural_text:
             return []
 
-        lines = [line.strip() for line in natural_text.splitlines() if line.strip()]
+        lines = [line for line in map(str.strip, natural_text.splitlines()) if line]
         return [(line, 1.0) for line in lines] or [(natural_text.strip(), 1.0)]
 
+    async def aclose(self) -> None:
+        """Close the HTTP client opened for the running event loop, if any."""
+        client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
     # ------------------------------------------------------------------ #
     # Internal helpers
     # ------------------------------------------------------------------ #
 
     def _prepare_pil_image(self, image_np: np.ndarray) -> Image.Image:
-        clipped = np.clip(image_np, 0, 255).astype(np.uint8)
+        if image_np.dtype != np.uint8:
+            image_np = np.clip(image_np, 0, 255).astype(np.uint8, copy=False)
 
-        if clipped.ndim == 2:
-            clipped = np.stack([clipped] * 3, axis=-1)
-        elif clipped.shape[2] == 4:
-            clipped = clipped[:, :, :3]
+        if image_np.ndim == 2:
+            # Keep greyscale as a single channel until after resizing; PIL expands to RGB at the end.
+            image = Image.fromarray(image_np, mode="L")
+        else:
+            if image_np.shape[2] == 4:
+                image_np = image_np[:, :, :3]
+            image = Image.fromarray(image_np, mode="RGB")
 
-        image = Image.fromarray(clipped, mode="RGB")
         image = ImageOps.exif_transpose(image)
         longest_dim = max(image.width, image.height)
         if longest_dim > self.target_longest_image_dim:
             scale = self.target_longest_image_dim / float(longest_dim)
             new_size = (max(1, int(round(image.width * scale))), max(1, int(round(image.height * scale))))
             image = image.resize(new_size, Image.Resampling.LANCZOS)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
         return image
 
-    def _run_with_retries(self, base_image: Image.Image) -> str:
+    async def _process_and_close(self, images: Sequence[np.ndarray]) -> List[List[Tuple[str, float]]]:
+        try:
+            return await self.aprocess_images(images)
+        finally:
+            await self.aclose()
+
+    def _prepare_page(self, image_np: np.ndarray) -> Tuple[Image.Image, bytes | None]:
+        # Resizing and hashing are CPU-bound, so this runs on a worker thread.
+        pil_image = self._prepare_pil_image(image_np)
+        cache_key = self._page_digest(pil_image) if self.page_cache_size else None
+        return pil_image, cache_key
+
+    async def _run_page(self, pil_image: Image.Image, cache_key: bytes | None) -> str:
+        if cache_key is None:
+            return await self._run_with_retries(pil_image)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        # Mark the outcome as retrieved so a failure nobody waited on is not logged as "never retrieved".
+        future.add_done_callback(lambda done: done.cancelled() or done.exception())
+        self._page_inflight[loop, cache_key] = future
+        try:
+            natural_text = await self._run_with_retries(pil_image)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            # Duplicates waiting on this page see the real error rather than a CancelledError.
+            future.set_exception(exc)
+            raise
+        finally:
+            del self._page_inflight[loop, cache_key]
+        self._page_cache_put(cache_key, natural_text)
+        future.set_result(natural_text)
+        return natural_text
+
+    @staticmethod
+    def _page_digest(image: Image.Image) -> bytes:
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f"{image.mode}:{image.width}x{image.height}".encode("ascii"))
+        digest.update(image.tobytes())
+        return digest.digest()
+
+    def _page_cache_get(self, key: bytes | None) -> str | None:
+        if key is None or key not in self._page_cache:
+            return None
+        self._page_cache.move_to_end(key)
+        return self._page_cache[key]
+
+    def _page_cache_put(self, key: bytes | None, natural_text: str) -> None:
+        # Failed pages come back empty; leave them uncached so a later duplicate is retried.
+        if key is None or not natural_text:
+            return
+        self._page_cache[key] = natural_text
+        self._page_cache.move_to_end(key)
+        while len(self._page_cache) > self.page_cache_size:
+            self._page_cache.popitem(last=False)
+
+    def _get_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = self._clients[loop] = httpx.AsyncClient(
+                timeout=self._timeout,
+                http2=True,
+                limits=httpx.Limits(max_connections=64, max_keepalive_connections=32, keepalive_expiry=60.0),
+            )
+        return client
+
+    async def _run_with_retries(self, base_image: Image.Image) -> str:
         rotation = 0
         attempt = 0
+        # The image only changes when the rotation does, so retries reuse the encoded bytes.
+        encoded_by_rotation: dict[int, str] = {}
+        deadline = time.monotonic() + self.max_page_seconds if self.max_page_seconds > 0 else None
 
         while attempt < self.max_retries:
-            rotated = self._apply_rotation(base_image, rotation)
-            payload = self._build_payload(rotated, attempt)
+            if deadline is not None and time.monotonic() >= deadline:
+                logger.error("olmOCR gave up after exceeding the %ss page budget", self.max_page_seconds)
+                return ""
+            if rotation not in encoded_by_rotation:
+                rotated = self._apply_rotation(base_image, rotation)
+                encoded_by_rotation[rotation] = await asyncio.to_thread(self._encode_image, rotated)
+            payload = self._build_payload(encoded_by_rotation[rotation], attempt)
+            # The page budget also bounds a single request, not just the gaps between attempts.
+            budget = asyncio.timeout(None if deadline is None else max(0.0, deadline - time.monotonic()))
             try:
-                response = self._dispatch(payload)
+                async with budget:
+                    response = await self._dispatch(payload)
                 page_response = self._parse_page_response(response)
+            except TimeoutError as exc:
+                if not budget.expired():
+                    logger.error("olmOCR request failed permanently: %s", exc)
+                    break
+                logger.error("olmOCR gave up after exceeding the %ss page budget", self.max_page_seconds)
+                return ""
             except TemporaryOcrError as exc:
-                backoff = min(30, 2 ** attempt)
-                logger.warning("Temporary olmOCR error (%s). Retrying in %ss.", exc, backoff)
-                time.sleep(backoff)
                 attempt += 1
+                if attempt >= self.max_retries:
+                    logger.warning("Temporary olmOCR error (%s) on the final attempt.", exc)
+                    continue
+                if exc.retry_after is not None:
+                    backoff = min(30, exc.retry_after)
+                else:
+                    backoff = min(30, (2 ** (attempt - 1)) * random.uniform(0.5, 1.5))
+                if deadline is not None:
+                    backoff = max(0.0, min(backoff, deadline - time.monotonic()))
+                logger.warning("Temporary olmOCR error (%s). Retrying in %.1fs.", exc, backoff)
+                await asyncio.sleep(backoff)
                 continue
             except Exception as exc:
                 logger.error("olmOCR request failed permanently: %s", exc)
                 break
 
             if not page_response.is_rotation_valid and attempt < self.max_retries - 1:
-                rotation = (rotation + page_response.rotation_correction) % 360
-                logger.info("olmOCR suggested rotation correction -> %s degrees", page_response.rotation_correction)
-                attempt += 1
-                continue
+                new_rotation = (rotation + page_response.rotation_correction) % 360
+                # A correction that lands on the current orientation would resend the same image;
+                # accept the text instead of paying for an identical round trip.
+                if new_rotation != rotation:
+                    rotation = new_rotation
+                    logger.info("olmOCR suggested rotation correction -> %s degrees", page_response.rotation_correction)
+                    attempt += 1
+                    continue
 
             return page_response.natural_text or ""
 
@@ -137,11 +340,13 @@ class OCRProcessor:
         }
         return image.transpose(transpose_map[rotation])
 
-    def _build_payload(self, image: Image.Image, attempt: int) -> dict:
+    def _encode_image(self, image: Image.Image) -> str:
+        # Level 1 zlib is several times cheaper than Pillow's default of 6 and stays lossless.
         buffer = io.BytesIO()
-        image.save(buffer, format="PNG")
-        encoded_image = base64.b64encode(buffer.getvalue()).decode("utf-8")
+        image.save(buffer, format="PNG", compress_level=1, optimize=False)
+        return base64.b64encode(buffer.getvalue()).decode("utf-8")
 
+    def _build_payload(self, encoded_image: str, attempt: int) -> dict:
         temperature = self.temperature_schedule[min(attempt, len(self.temperature_schedule) - 1)]
         return {
             "model": self.model_name,
@@ -159,21 +364,44 @@ class OCRProcessor:
             "priority": self.max_retries - attempt,
         }
 
-    def _dispatch(self, payload: dict) -> dict:
+    async def _dispatch(self, payload: dict) -> dict:
         headers = {"Content-Type": "application/json"}
         if self.api_key:
             headers["Authorization"] = f"Bearer {self.api_key}"
 
         url = f"{self.server_url}/chat/completions"
-        with ocr_lock:
-            response = self._client.post(url, headers=headers, json=payload)
+        await self._limiter.acquire()
+        response = await self._get_client().post(url, headers=headers, json=payload)
 
-        if response.status_code in {408, 409, 425, 429, 500, 502, 503, 504}:
-            raise TemporaryOcrError(f"{response.status_code} {response.text}")
+        if response.is_error and self._is_transient(response):
+            raise TemporaryOcrError(
+                f"{response.status_code} {response.text}",
+                retry_after=self._parse_retry_after(response.headers.get("retry-after")),
+            )
 
         response.raise_for_status()
         return response.json()
 
+    @staticmethod
+    def _is_transient(response: httpx.Response) -> bool:
+        if response.status_code in TRANSIENT_STATUS_CODES:
+            return True
+        body = response.text.lower()
+        return any(marker in body for marker in RATE_LIMIT_MARKERS)
+
+    @staticmethod
+    def _parse_retry_after(value: str | None) -> float | None:
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
     def _parse_page_response(self, response_json: dict) -> PageResponse:
         if "choices" not in response_json or not response_json["choices"]:
             raise ValueError("olmOCR response missing choices")
@@ -20,7 +20,7 @@ def main(image_path: str = "02.png") -> None:
         raise FileNotFoundError(f"{path} was not found")
 
     image = Image.open(path).convert("RGB")
-    results = ocr.process_image(np.array(image))
+    results = ocr.process_image(np.asarray(image))
 
     if not results:
         print("No text extracted.")
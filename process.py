@@ -1,16 +1,19 @@
 import argparse
+import asyncio
 import io
 import json
 import logging
 import os
+import tempfile
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import Iterable, List
+from typing import Iterable, Iterator, List, Tuple
 
 import cairosvg
 import numpy as np
 import psycopg2
 from dotenv import load_dotenv
-from pdf2image import convert_from_bytes
+from pdf2image import convert_from_path, pdfinfo_from_path
 from PIL import Image
 
 from ocr_module import OCRProcessor
@@ -21,22 +24,24 @@ logger = logging.getLogger("ocr-runner")
 
 def load_image(path: Path) -> np.ndarray:
     image = Image.open(path).convert("RGB")
-    return np.array(image)
+    return np.asarray(image)
 
 
-def run_single_image(ocr: OCRProcessor, path: Path) -> dict:
-    image_np = load_image(path)
-    lines = run_ocr_on_array(ocr, image_np)
+async def run_single_image(ocr: OCRProcessor, path: Path) -> dict:
+    image_np = await asyncio.to_thread(load_image, path)
     return {
         "source": "file",
         "file": str(path),
-        "pages": [{"page": 1, "lines": lines}],
+        "pages": await ocr_pages(ocr, [image_np]),
         "success": True,
     }
 
 
 def run_ocr_on_array(ocr: OCRProcessor, image_np: np.ndarray) -> List[dict]:
-    results = ocr.process_image(image_np)
+    return format_lines(ocr.process_image(image_np))
+
+
+def format_lines(results: List[Tuple[str, float]]) -> List[dict]:
     return [{"text": text, "score": score} for text, score in results]
 
 
@@ -63,40 +68,94 @@ def fetch_blob(conn, blob_id: int):
         return row[0], row[1]
 
 
+def prefetch_blobs(conn, blob_ids: Iterable[int]) -> Iterator[Tuple[int, Future]]:
+    """Yield ``(blob_id, future)`` pairs, fetching the next blob while the caller OCRs the current one."""
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        pending = None
+        for blob_id in blob_ids:
+            future = executor.submit(fetch_blob, conn, blob_id)
+            if pending:
+                yield pending
+            pending = (blob_id, future)
+        if pending:
+            yield pending
+
+
 def binary_to_images(binary: bytes, filename: str) -> Iterable[np.ndarray]:
     suffix = (Path(filename).suffix or "").lower()
 
     if suffix in {".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff"}:
         image = Image.open(io.BytesIO(binary)).convert("RGB")
-        yield np.array(image)
+        yield np.asarray(image)
         return
 
     if suffix == ".pdf":
-        pages = convert_from_bytes(binary, dpi=300)
-        for page in pages:
-            yield np.array(page.convert("RGB"))
+        # Rasterise one page at a time so memory scales with pages in flight, not document length.
+        # The PDF is written to disk once; the *_bytes helpers would re-write it on every call.
+        with tempfile.TemporaryDirectory() as tmpdir:
+            pdf_path = Path(tmpdir) / "document.pdf"
+            pdf_path.write_bytes(binary)
+            page_count = pdfinfo_from_path(str(pdf_path))["Pages"]
+            for page_number in range(1, page_count + 1):
+                page = convert_from_path(str(pdf_path), dpi=300, first_page=page_number, last_page=page_number)[0]
+                yield np.asarray(page.convert("RGB"))
+                del page
         return
 
     if suffix == ".svg":
         png_bytes = cairosvg.svg2png(bytestring=binary)
         image = Image.open(io.BytesIO(png_bytes)).convert("RGB")
-        yield np.array(image)
+        yield np.asarray(image)
         return
 
     # Fallback: try to interpret as image
     image = Image.open(io.BytesIO(binary)).convert("RGB")
-    yield np.array(image)
+    yield np.asarray(image)
+
 
+async def ocr_pages(ocr: OCRProcessor, images: Iterable[np.ndarray]) -> List[dict]:
+    """OCR a lazily produced page stream, keeping at most ``ocr.max_concurrency`` pages in flight.
 
-def run_blob(ocr: OCRProcessor, conn, blob_id: int) -> dict:
-    filename, binary = fetch_blob(conn, blob_id)
+    A new page is rasterised as soon as any slot frees up, so one slow page does not stall the others.
+    """
+    slots = asyncio.Semaphore(ocr.max_concurrency)
+    results: List[List[Tuple[str, float]] | None] = []
+    tasks: List[asyncio.Task] = []
+    images = iter(images)
+
+    async def run_page(index: int, image_np: np.ndarray) -> None:
+        try:
+            results[index] = await ocr.aprocess_image(image_np)
+        finally:
+            slots.release()
+
+    try:
+        while True:
+            await slots.acquire()
+            # Decoding/rasterising (e.g. pdftoppm) runs off the event loop so in-flight requests keep moving.
+            image_np = await asyncio.to_thread(next, images, None)
+            if image_np is None:
+                slots.release()
+                break
+            results.append(None)
+            tasks.append(asyncio.create_task(run_page(len(results) - 1, image_np)))
+            del image_np
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    return [{"page": idx, "lines": format_lines(lines)} for idx, lines in enumerate(results, start=1)]
+
+
+async def run_blob(ocr: OCRProcessor, conn, blob_id: int, blob: Tuple[str, bytes] | None = None) -> dict:
+    filename, binary = blob if blob is not None else await asyncio.to_thread(fetch_blob, conn, blob_id)
     if not binary:
         return {"source": "blob", "blob_id": blob_id, "success": False, "error": "not_found"}
 
-    pages = []
-    for idx, image_np in enumerate(binary_to_images(binary, filename or f"blob_{blob_id}"), start=1):
-        lines = run_ocr_on_array(ocr, image_np)
-        pages.append({"page": idx, "lines": lines})
+    images = binary_to_images(binary, filename or f"blob_{blob_id}")
+    pages = await ocr_pages(ocr, images)
 
     return {
         "source": "blob",
@@ -107,51 +166,68 @@ def run_blob(ocr: OCRProcessor, conn, blob_id: int) -> dict:
     }
 
 
-def main() -> None:
-    load_dotenv()
-    parser = argparse.ArgumentParser(description="Run olmOCR on local files or Postgres blobs.")
-    parser.add_argument("inputs", nargs="*", help="Image paths (PNG/JPG/PDF/SVG) to process.")
-    parser.add_argument("--blob-ids", nargs="*", type=int, help="case_blob IDs to process via Postgres.")
-    args = parser.parse_args()
-
-    if not args.inputs and not args.blob_ids:
-        parser.error("Provide at least one file path or --blob-ids.")
-
-    ocr = OCRProcessor()
-    conn = None
+async def run_files(ocr: OCRProcessor, inputs: List[str]) -> List[dict]:
     payload = []
-
-    for item in args.inputs:
+    for item in inputs:
         path = Path(item)
         if not path.exists():
             logger.error("File not found: %s", path)
             payload.append({"source": "file", "file": str(path), "success": False, "error": "file_not_found"})
             continue
         try:
-            payload.append(run_single_image(ocr, path))
+            payload.append(await run_single_image(ocr, path))
         except Exception as exc:  # pragma: no cover - runtime safety
             logger.exception("Failed to process %s", path)
             payload.append({"source": "file", "file": str(path), "success": False, "error": str(exc)})
+    return payload
 
-    if args.blob_ids:
-        try:
-            conn = connect_db()
-        except Exception as exc:
-            logger.exception("Failed to connect to Postgres")
-            for blob_id in args.blob_ids:
-                payload.append({"source": "blob", "blob_id": blob_id, "success": False, "error": f"db_error: {exc}"})
-        else:
-            with conn:
-                for blob_id in args.blob_ids:
-                    try:
-                        payload.append(run_blob(ocr, conn, blob_id))
-                    except Exception as exc:
-                        logger.exception("Failed to process blob %s", blob_id)
-                        payload.append({"source": "blob", "blob_id": blob_id, "success": False, "error": str(exc)})
-        finally:
-            if conn:
-                conn.close()
 
+async def run_blobs(ocr: OCRProcessor, blob_ids: List[int]) -> List[dict]:
+    payload = []
+    conn = None
+    try:
+        conn = connect_db()
+    except Exception as exc:
+        logger.exception("Failed to connect to Postgres")
+        for blob_id in blob_ids:
+            payload.append({"source": "blob", "blob_id": blob_id, "success": False, "error": f"db_error: {exc}"})
+    else:
+        with conn:
+            for blob_id, blob in prefetch_blobs(conn, blob_ids):
+                try:
+                    payload.append(await run_blob(ocr, conn, blob_id, blob=await asyncio.wrap_future(blob)))
+                except Exception as exc:
+                    logger.exception("Failed to process blob %s", blob_id)
+                    payload.append({"source": "blob", "blob_id": blob_id, "success": False, "error": str(exc)})
+    finally:
+        if conn:
+            conn.close()
+    return payload
+
+
+async def run_inputs(inputs: List[str], blob_ids: List[int] | None) -> List[dict]:
+    """Process every input in one event loop so the olmOCR connection pool is reused across documents."""
+    ocr = OCRProcessor()
+    try:
+        payload = await run_files(ocr, inputs)
+        if blob_ids:
+            payload.extend(await run_blobs(ocr, blob_ids))
+        return payload
+    finally:
+        await ocr.aclose()
+
+
+def main() -> None:
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Run olmOCR on local files or Postgres blobs.")
+    parser.add_argument("inputs", nargs="*", help="Image paths (PNG/JPG/PDF/SVG) to process.")
+    parser.add_argument("--blob-ids", nargs="*", type=int, help="case_blob IDs to process via Postgres.")
+    args = parser.parse_args()
+
+    if not args.inputs and not args.blob_ids:
+        parser.error("Provide at least one file path or --blob-ids.")
+
+    payload = asyncio.run(run_inputs(args.inputs, args.blob_ids))
     print(json.dumps(payload, ensure_ascii=False, indent=2))
 
 